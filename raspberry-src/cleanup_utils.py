@@ -3,13 +3,14 @@ Cleanup utilities for YOLO Detection Service.
 
 Handles automatic cleanup of pending cache, old images, and temporary files.
 """
+import heapq
 import json
 import os
 import time
 from pathlib import Path
 from typing import Dict, List
 
-from utils import logger
+from utils import json_dumps, json_loads, logger
 
 # Cleanup configuration (can be overridden by environment variables)
 PENDING_MAX_AGE_DAYS = int(os.getenv("CLEANUP_PENDING_MAX_AGE_DAYS", "7"))
@@ -46,8 +47,8 @@ def cleanup_pending_cache(pending_path: str = "pending_supabase.json") -> Dict[s
         }
 
     try:
-        with open(pending_path, "r", encoding="utf-8") as f:
-            entries = json.load(f)
+        with open(pending_path, "rb") as f:
+            entries = json_loads(f.read())
     except (json.JSONDecodeError, IOError) as exc:
         logger.warning(f"Failed to read pending cache: {exc}")
         return {
@@ -69,8 +70,7 @@ def cleanup_pending_cache(pending_path: str = "pending_supabase.json") -> Dict[s
         }
 
     total_before = len(entries)
-    current_time = time.time()
-    max_age_seconds = PENDING_MAX_AGE_DAYS * 24 * 3600
+    cutoff_ts = time.time() - PENDING_MAX_AGE_DAYS * 24 * 3600
 
     # Filter out old entries
     filtered_entries = []
@@ -82,9 +82,7 @@ def cleanup_pending_cache(pending_path: str = "pending_supabase.json") -> Dict[s
             continue
 
         # Check age
-        entry_timestamp = entry.get("ts", 0)
-        age_seconds = current_time - entry_timestamp
-        if age_seconds > max_age_seconds:
+        if entry.get("ts", 0) < cutoff_ts:
             removed_old += 1
             continue
 
@@ -96,18 +94,20 @@ def cleanup_pending_cache(pending_path: str = "pending_supabase.json") -> Dict[s
 
         filtered_entries.append(entry)
 
-    # Keep only most recent entries (sorted by timestamp, newest first)
-    filtered_entries.sort(key=lambda x: x.get("ts", 0), reverse=True)
-    removed_excess = max(0, len(filtered_entries) - PENDING_MAX_ENTRIES)
-    filtered_entries = filtered_entries[:PENDING_MAX_ENTRIES]
+    # Keep only most recent entries (newest first); partial selection, no full sort
+    kept_entries = heapq.nlargest(
+        PENDING_MAX_ENTRIES, filtered_entries, key=lambda x: x.get("ts", 0)
+    )
+    removed_excess = len(filtered_entries) - len(kept_entries)
+    filtered_entries = kept_entries
 
     total_after = len(filtered_entries)
 
     # Write back cleaned entries
     try:
         tmp_path = f"{pending_path}.tmp"
-        with open(tmp_path, "w", encoding="utf-8") as f:
-            json.dump(filtered_entries, f, indent=2)
+        with open(tmp_path, "wb") as f:
+            f.write(json_dumps(filtered_entries, indent=True))
         os.replace(tmp_path, pending_path)
     except IOError as exc:
         logger.error(f"Failed to write cleaned pending cache: {exc}")
@@ -171,12 +171,14 @@ def cleanup_images(
             "total_after": 0,
         }
 
-    # Get all image files with their stats
+    # Get all image files with their stats (scandir reuses directory entry data,
+    # avoiding a separate stat() call per file where the OS provides it)
     image_files: List[tuple] = []
-    for file_path in directory.iterdir():
-        if file_path.is_file() and file_path.suffix.lower() in {".jpg", ".jpeg", ".png"}:
-            stat = file_path.stat()
-            image_files.append((file_path, stat.st_mtime, stat.st_size))
+    with os.scandir(directory) as it:
+        for entry in it:
+            if entry.is_file() and entry.name.lower().endswith((".jpg", ".jpeg", ".png")):
+                stat = entry.stat()
+                image_files.append((entry.path, stat.st_mtime, stat.st_size))
 
     total_before = len(image_files)
     if total_before == 0:
@@ -203,7 +205,7 @@ def cleanup_images(
         age_seconds = current_time - mtime
         if age_seconds > max_age_seconds:
             try:
-                file_path.unlink()
+                os.unlink(file_path)
                 removed_old += 1
             except OSError as exc:
                 logger.warning(f"Failed to remove old image {file_path}: {exc}")
@@ -216,7 +218,7 @@ def cleanup_images(
         excess_count = len(remaining_files) - max_count
         for file_path, _, _ in remaining_files[:excess_count]:
             try:
-                file_path.unlink()
+                os.unlink(file_path)
                 removed_excess += 1
             except OSError as exc:
                 logger.warning(f"Failed to remove excess image {file_path}: {exc}")
@@ -228,7 +230,7 @@ def cleanup_images(
     while total_size > max_size_bytes and remaining_files:
         file_path, _, size = remaining_files.pop(0)
         try:
-            file_path.unlink()
+            os.unlink(file_path)
             total_size -= size
             removed_size += 1
         except OSError as exc:
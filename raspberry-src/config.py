@@ -5,6 +5,18 @@ Contains all environment variables, constants, and paths used throughout the app
 """
 import os
 from pathlib import Path
+from typing import Set
+
+
+def _env_bool(name: str, default: str = "0") -> bool:
+    """Parse a boolean flag from the environment ("1", "true", "yes")."""
+    return os.getenv(name, default).lower() in {"1", "true", "yes"}
+
+
+def _env_cpu_set(name: str) -> Set[int]:
+    """Parse a comma-separated CPU list ("2,3") from the environment; bad entries are ignored."""
+    return {int(cpu) for cpu in os.getenv(name, "").split(",") if cpu.strip().isdigit()}
+
 
 # -----------------------------
 # Environment Variables
@@ -12,16 +24,28 @@ from pathlib import Path
 
 # YOLO Model Configuration
 MODEL_PATH = os.getenv("YOLO_MODEL_PATH", "best_ncnn_model")
+INFERENCE_SIZE = int(os.getenv("RS_INFERENCE_SIZE", "640"))  # YOLO input size; frames keep capture resolution
+INFERENCE_HALF = _env_bool("RS_INFERENCE_HALF")  # FP16 inference (CUDA .pt/.engine; ignored on CPU backends)
+WARMUP_RUNS = int(os.getenv("RS_WARMUP_RUNS", "2"))  # Dummy inferences at startup (0 disables)
 
 # RealSense Camera Configuration
 FRAME_WIDTH = int(os.getenv("RS_FRAME_WIDTH", "1280"))
 FRAME_HEIGHT = int(os.getenv("RS_FRAME_HEIGHT", "720"))
 FRAME_RATE = int(os.getenv("RS_FRAME_RATE", "15"))
+ENABLE_DEPTH = _env_bool("RS_ENABLE_DEPTH")  # Depth is unused by detection
+# "yuyv" skips librealsense's (non-NEON on ARM) RGB conversion; OpenCV converts to BGR instead
+COLOR_FORMAT = os.getenv("RS_COLOR_FORMAT", "bgr8").strip().lower()
 
 # Detection & Sending Configuration
 SEND_INTERVAL = float(os.getenv("RS_SEND_INTERVAL", "15"))
 CONF_THRESHOLD = float(os.getenv("RS_CONF_THRESHOLD", "0.5"))
-ENABLE_AUTO_DETECTION = os.getenv("RS_ENABLE_AUTO_DETECTION", "0").lower() in {"1", "true", "yes"}
+ENABLE_AUTO_DETECTION = _env_bool("RS_ENABLE_AUTO_DETECTION")
+
+# Pipeline Queues (capture -> inference -> upload)
+# CPUs reserved for the inference thread, e.g. "2,3" (other threads get the rest; empty = no pinning)
+INFERENCE_CPUS = _env_cpu_set("RS_INFERENCE_CPUS")
+FRAME_QUEUE_SIZE = int(os.getenv("RS_FRAME_QUEUE_SIZE", "1"))  # Single slot: inference always takes the freshest frame
+SEND_QUEUE_SIZE = int(os.getenv("RS_SEND_QUEUE_SIZE", "4"))  # Oldest pending detection is dropped when full
 
 # HTTP Server Configuration
 STREAM_HOST = os.getenv("RS_STREAM_HOST", "0.0.0.0")
@@ -31,9 +55,11 @@ STREAM_PORT = int(os.getenv("RS_STREAM_PORT", "8080"))
 JPEG_QUALITY = int(os.getenv("RS_JPEG_QUALITY", "90"))  # Legacy, kept for compatibility
 JPEG_QUALITY_STREAM = int(os.getenv("RS_JPEG_QUALITY_STREAM", "70"))  # For MJPEG streaming
 JPEG_QUALITY_SNAPSHOT = int(os.getenv("RS_JPEG_QUALITY_SNAPSHOT", "90"))  # For snapshots and detections
+JPEG_QUALITY_CROP = int(os.getenv("RS_JPEG_QUALITY_CROP", "85"))  # For plant crops sent with detections
+OPENCV_THREADS = int(os.getenv("RS_OPENCV_THREADS", "0"))  # cv2.setNumThreads; 0 keeps OpenCV's default
 
 # Display Configuration
-ENABLE_DISPLAY = os.getenv("RS_ENABLE_DISPLAY", "0").lower() in {"1", "true", "yes"}
+ENABLE_DISPLAY = _env_bool("RS_ENABLE_DISPLAY")
 WINDOW_NAME = "YOLO Detection Results"
 
 # Raspberry Pi & Cloud Configuration
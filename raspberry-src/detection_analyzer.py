@@ -3,46 +3,66 @@ Detection analysis functions for YOLO Detection Service.
 
 Contains functions for analyzing YOLO detections and determining plant health status.
 """
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from typing import Dict, Optional, Tuple
 
 import numpy as np
 
-from config import CONF_THRESHOLD
-from image_processing import encode_frame_to_base64
-from utils import safe_bbox_coords
+try:
+    from numba import njit  # optional JIT for the IoU kernel
+except ImportError:
+    njit = None
 
+from config import JPEG_QUALITY_CROP
+from image_processing import encode_frame_to_jpeg
+from utils import KIND_PEST, KIND_PLANT, Detections, clip_boxes
 
-def summarize_detections(boxes, labels) -> Tuple[str, Optional[float], int]:
+# Maximum plant crops per detection (submit-detection accepts up to 3)
+MAX_PLANTS = 3
+
+# Plant counts as diseased when a mealybug box overlaps it by more than this IoU
+IOU_THRESHOLD = 0.3
+
+# Plant crops are expanded by this fraction of the box size on each side
+CROP_EXPANSION = 0.1
+
+# cv2.imencode releases the GIL, so main frame and crops encode in parallel
+_ENCODE_POOL = ThreadPoolExecutor(max_workers=MAX_PLANTS + 1, thread_name_prefix="jpeg-encode")
+
+
+@dataclass
+class PlantStatus:
+    """Health status of one cropped plant (dataclasses.asdict for JSON)."""
+
+    __slots__ = ("order_num", "status", "confidence")
+
+    order_num: int
+    status: str
+    confidence: float
+
+
+def summarize_detections(
+    detections: Detections, class_kinds: np.ndarray
+) -> Tuple[str, Optional[float], int]:
     """
-    Summarize detection results into status, confidence, and object count.
+    Summarize thresholded detections into status, confidence, and object count.
 
     Returns:
         (status, confidence, count)
         status: "noObjects" | "healthy" | "diseased" | "mixed"
     """
-    if boxes is None or len(boxes) == 0:
+    _, confs, clss = detections
+    kept = len(confs)
+    if kept == 0:
         return "noObjects", None, 0
 
-    has_mealybug = False
-    has_chrysanthemum = False
-    highest_conf = 0.0
-    kept = 0
-
-    for box in boxes:
-        conf = float(box.conf.item())
-        if conf < CONF_THRESHOLD:
-            continue
-        kept += 1
-        highest_conf = max(highest_conf, conf * 100.0)
-        class_idx = int(box.cls.item())
-        classname = str(labels.get(class_idx, class_idx)).lower()
-        if "mealybug" in classname:
-            has_mealybug = True
-        if "chrysanthemum" in classname:
-            has_chrysanthemum = True
+    highest_conf = float(confs.max()) * 100.0
+    # One pass over the detections: count per kind (other / plant / pest)
+    kind_counts = np.bincount(class_kinds[clss], minlength=3)
+    has_mealybug = kind_counts[KIND_PEST] > 0
+    has_chrysanthemum = kind_counts[KIND_PLANT] > 0
 
-    if kept == 0:
-        return "noObjects", None, 0
     if has_mealybug and has_chrysanthemum:
         return "mixed", highest_conf, kept
     if has_mealybug:
@@ -50,162 +70,177 @@ def summarize_detections(boxes, labels) -> Tuple[str, Optional[float], int]:
     return "healthy", highest_conf, kept
 
 
-def calculate_iou(box1, box2) -> float:
-    """Calculate Intersection over Union (IoU) between two bounding boxes."""
-    x1_min, y1_min, x1_max, y1_max = box1
-    x2_min, y2_min, x2_max, y2_max = box2
+def iou_matrix(boxes1: np.ndarray, boxes2: np.ndarray) -> np.ndarray:
+    """Calculate pairwise IoU between (N, 4) and (M, 4) xyxy boxes. Returns (N, M)."""
+    # In-place ops keep the number of (N, M) temporaries to a minimum
+    inter_area = np.minimum(boxes1[:, None, 2], boxes2[None, :, 2])
+    inter_area -= np.maximum(boxes1[:, None, 0], boxes2[None, :, 0])
+    np.maximum(inter_area, 0, out=inter_area)
+    inter_h = np.minimum(boxes1[:, None, 3], boxes2[None, :, 3])
+    inter_h -= np.maximum(boxes1[:, None, 1], boxes2[None, :, 1])
+    np.maximum(inter_h, 0, out=inter_h)
+    inter_area *= inter_h
+
+    area1 = (boxes1[:, 2] - boxes1[:, 0]) * (boxes1[:, 3] - boxes1[:, 1])
+    area2 = (boxes2[:, 2] - boxes2[:, 0]) * (boxes2[:, 3] - boxes2[:, 1])
+    union_area = area1[:, None] + area2[None, :]
+    union_area -= inter_area
+
+    return np.divide(
+        inter_area, union_area, out=np.zeros(union_area.shape), where=union_area != 0
+    )
 
-    # Calculate intersection area
-    inter_x_min = max(x1_min, x2_min)
-    inter_y_min = max(y1_min, y2_min)
-    inter_x_max = min(x1_max, x2_max)
-    inter_y_max = min(y1_max, y2_max)
 
-    if inter_x_max < inter_x_min or inter_y_max < inter_y_min:
-        return 0.0
+def _no_objects_result(main_image_jpeg: Optional[bytes]) -> Dict[str, object]:
+    """Build analysis result for a frame without plants."""
+    return {
+        "main_image_jpeg": main_image_jpeg,
+        "plant_images_jpeg": [],
+        "overall_status": "noObjects",
+        "plant_statuses": [],
+        "confidence": None,
+    }
+
+
+def _overlap_mask_loop(
+    boxes1: np.ndarray, boxes2: np.ndarray, threshold: float
+) -> np.ndarray:
+    """Per-row any(IoU > threshold) with early exit; compiled by numba when available."""
+    out = np.zeros(boxes1.shape[0], dtype=np.bool_)
+    for i in range(boxes1.shape[0]):
+        area1 = (boxes1[i, 2] - boxes1[i, 0]) * (boxes1[i, 3] - boxes1[i, 1])
+        for j in range(boxes2.shape[0]):
+            # Disjoint pairs (the common case) skip the area/division work
+            inter_w = min(boxes1[i, 2], boxes2[j, 2]) - max(boxes1[i, 0], boxes2[j, 0])
+            if inter_w <= 0:
+                continue
+            inter_h = min(boxes1[i, 3], boxes2[j, 3]) - max(boxes1[i, 1], boxes2[j, 1])
+            if inter_h <= 0:
+                continue
+            inter_area = inter_w * inter_h
+            area2 = (boxes2[j, 2] - boxes2[j, 0]) * (boxes2[j, 3] - boxes2[j, 1])
+            union_area = area1 + area2 - inter_area
+            if union_area != 0 and inter_area / union_area > threshold:
+                out[i] = True
+                break
+    return out
 
-    inter_area = (inter_x_max - inter_x_min) * (inter_y_max - inter_y_min)
 
-    # Calculate union area
-    box1_area = (x1_max - x1_min) * (y1_max - y1_min)
-    box2_area = (x2_max - x2_min) * (y2_max - y2_min)
-    union_area = box1_area + box2_area - inter_area
+def _overlap_mask_numpy(
+    boxes1: np.ndarray, boxes2: np.ndarray, threshold: float
+) -> np.ndarray:
+    """Per-row any(IoU > threshold) via the full IoU matrix."""
+    return (iou_matrix(boxes1, boxes2) > threshold).any(axis=1)
 
-    if union_area == 0:
-        return 0.0
 
-    return inter_area / union_area
+if njit is not None:
+    _overlap_mask = njit(cache=True)(_overlap_mask_loop)
+    # Pay the JIT cost at import rather than on the first detection
+    _overlap_mask(np.zeros((1, 4), dtype=int), np.zeros((1, 4), dtype=int), IOU_THRESHOLD)
+else:
+    _overlap_mask = _overlap_mask_numpy
 
 
 def analyze_detection_with_crops(
-    frame: np.ndarray, boxes, labels_dict: Dict
+    frame: np.ndarray,
+    detections: Detections,
+    class_kinds: np.ndarray,
+    encode_on_empty: bool = True,
 ) -> Dict[str, object]:
     """
     Analyze detection frame and create crops for each chrysanthemum plant.
 
+    detections come from boxes_to_arrays() with CONF_THRESHOLD applied; their
+    xyxy array is clamped to the frame in place.
+
+    With encode_on_empty=False the main image is only encoded when plants are
+    found; noObjects results then carry main_image_jpeg=None.
+
     Returns:
         {
-            "main_image_b64": str,
-            "plant_images_b64": List[str],
+            "main_image_jpeg": Optional[bytes],
+            "plant_images_jpeg": List[bytes],
             "overall_status": str,
-            "plant_statuses": List[Dict],
+            "plant_statuses": List[PlantStatus],
             "confidence": float
         }
     """
     h, w = frame.shape[:2]
 
-    if boxes is None or len(boxes) == 0:
+    # Encode the main image once, overlapping the analysis
+    main_future = (
+        _ENCODE_POOL.submit(encode_frame_to_jpeg, frame) if encode_on_empty else None
+    )
+
+    xyxy, confs, clss = detections
+    if len(confs) == 0:
         # No objects detected
-        main_image_b64 = encode_frame_to_base64(frame, "main.jpg")["data"]
-        return {
-            "main_image_b64": main_image_b64,
-            "plant_images_b64": [],
-            "overall_status": "noObjects",
-            "plant_statuses": [],
-            "confidence": None,
-        }
+        return _no_objects_result(main_future.result() if main_future else None)
 
     # Collect chrysanthemum and mealybug detections
-    chrysanthemums = []
-    mealybugs = []
-
-    for box in boxes:
-        conf = float(box.conf.item())
-        if conf < CONF_THRESHOLD:
-            continue
-
-        class_idx = int(box.cls.item())
-        classname = labels_dict.get(class_idx, str(class_idx)).lower()
-
-        xyxy_tensor = box.xyxy.cpu()
-        xyxy = xyxy_tensor.numpy().squeeze()
-        xmin, ymin, xmax, ymax = xyxy.astype(int)
-        xmin, ymin, xmax, ymax = safe_bbox_coords(xmin, ymin, xmax, ymax, w, h)
-
-        if "chrysanthemum" in classname:
-            chrysanthemums.append(
-                {"bbox": (xmin, ymin, xmax, ymax), "confidence": conf * 100.0}
-            )
-        elif "mealybug" in classname:
-            mealybugs.append(
-                {"bbox": (xmin, ymin, xmax, ymax), "confidence": conf * 100.0}
-            )
+    clip_boxes(xyxy, w, h)
 
-    # If no chrysanthemums found, return noObjects
-    if not chrysanthemums:
-        main_image_b64 = encode_frame_to_base64(frame, "main.jpg")["data"]
-        return {
-            "main_image_b64": main_image_b64,
-            "plant_images_b64": [],
-            "overall_status": "noObjects",
-            "plant_statuses": [],
-            "confidence": None,
-        }
+    kinds = class_kinds[clss]
+    is_pest = kinds == KIND_PEST
 
-    # Limit to 3 plants maximum
-    chrysanthemums = chrysanthemums[:3]
+    # Keep the MAX_PLANTS most confident plants, highest confidence first
+    plant_idx = np.flatnonzero(kinds == KIND_PLANT)
+    if len(plant_idx) > MAX_PLANTS:
+        plant_idx = plant_idx[np.argpartition(-confs[plant_idx], MAX_PLANTS - 1)[:MAX_PLANTS]]
+    plant_idx = plant_idx[np.argsort(-confs[plant_idx], kind="stable")]
 
-    # Analyze each chrysanthemum for mealybug infection
-    plant_statuses = []
-    plant_images_b64 = []
+    # Parallel arrays per class; dicts are only built for the result
+    plant_boxes = xyxy[plant_idx]
+    plant_confs = confs[plant_idx] * np.float32(100.0)
+    pest_boxes = xyxy[is_pest]
 
-    for idx, plant in enumerate(chrysanthemums, start=1):
-        plant_bbox = plant["bbox"]
-        plant_conf = plant["confidence"]
-
-        # Check if any mealybug intersects with this plant (IoU > 0.3)
-        is_diseased = False
-        for mealybug in mealybugs:
-            iou = calculate_iou(plant_bbox, mealybug["bbox"])
-            if iou > 0.3:
-                is_diseased = True
-                break
-
-        # Determine plant status
-        plant_status = "diseased" if is_diseased else "healthy"
-        plant_statuses.append(
-            {
-                "order_num": idx,
-                "status": plant_status,
-                "confidence": round(plant_conf, 2),
-            }
+    # If no chrysanthemums found, return noObjects
+    if len(plant_boxes) == 0:
+        return _no_objects_result(main_future.result() if main_future else None)
+    if main_future is None:
+        main_future = _ENCODE_POOL.submit(encode_frame_to_jpeg, frame)
+
+    # A plant is diseased if any mealybug intersects it (IoU > IOU_THRESHOLD)
+    is_diseased = _overlap_mask(plant_boxes, pest_boxes, IOU_THRESHOLD)
+
+    # Create crops with 10% expansion, clamped to the frame
+    margin = (plant_boxes[:, 2:] - plant_boxes[:, :2]) * CROP_EXPANSION
+    crop_boxes = np.hstack(
+        (plant_boxes[:, :2] - margin, plant_boxes[:, 2:] + margin)
+    ).astype(int)
+    crop_boxes = np.clip(crop_boxes, 0, (w, h, w, h))
+
+    # Encode each crop as soon as it is sliced; futures keep plant order.
+    # Views are passed as-is; the encoder deals with their row stride
+    crop_futures = [
+        _ENCODE_POOL.submit(
+            encode_frame_to_jpeg, frame[ymin:ymax, xmin:xmax], JPEG_QUALITY_CROP
         )
-
-        # Create crop with 10% expansion
-        xmin, ymin, xmax, ymax = plant_bbox
-        bbox_w = xmax - xmin
-        bbox_h = ymax - ymin
-        expansion = 0.1
-
-        crop_xmin = max(0, int(xmin - bbox_w * expansion))
-        crop_ymin = max(0, int(ymin - bbox_h * expansion))
-        crop_xmax = min(w, int(xmax + bbox_w * expansion))
-        crop_ymax = min(h, int(ymax + bbox_h * expansion))
-
-        crop = frame[crop_ymin:crop_ymax, crop_xmin:crop_xmax]
-        crop_b64 = encode_frame_to_base64(crop, f"plant_{idx}.jpg")["data"]
-        plant_images_b64.append(crop_b64)
+        for xmin, ymin, xmax, ymax in crop_boxes.tolist()
+    ]
+
+    # Per-plant statuses, in confidence order
+    plant_statuses = [
+        PlantStatus(idx, "diseased" if diseased else "healthy", round(plant_conf, 2))
+        for idx, (plant_conf, diseased) in enumerate(
+            zip(plant_confs.tolist(), is_diseased.tolist()), start=1
+        )
+    ]
 
     # Determine overall status
-    statuses = [p["status"] for p in plant_statuses]
-    if all(s == "healthy" for s in statuses):
+    if not is_diseased.any():
         overall_status = "healthy"
-    elif all(s == "diseased" for s in statuses):
+    elif is_diseased.all():
         overall_status = "diseased"
     else:
         overall_status = "mixed"
 
     # Calculate average confidence
-    avg_confidence = sum(p["confidence"] for p in plant_statuses) / len(
-        plant_statuses
-    )
-
-    # Encode main image
-    main_image_b64 = encode_frame_to_base64(frame, "main.jpg")["data"]
+    avg_confidence = sum(p.confidence for p in plant_statuses) / len(plant_statuses)
 
     return {
-        "main_image_b64": main_image_b64,
-        "plant_images_b64": plant_images_b64,
+        "main_image_jpeg": main_future.result(),
+        "plant_images_jpeg": [future.result() for future in crop_futures],
         "overall_status": overall_status,
         "plant_statuses": plant_statuses,
         "confidence": round(avg_confidence, 2),
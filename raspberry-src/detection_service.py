@@ -6,12 +6,14 @@ YOLO inference, and cloud communication.
 """
 from __future__ import annotations
 
+import logging
+import os
+import queue
 import threading
 import time
-from dataclasses import dataclass, field
-from datetime import datetime
+from dataclasses import asdict, dataclass, field
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Dict, List, Optional, Tuple
 
 import cv2
 import numpy as np
@@ -27,25 +29,49 @@ except ImportError as exc:
 
 from config import (
     API_KEY,
+    COLOR_FORMAT,
+    CONF_THRESHOLD,
     DEVICE_ID,
     ENABLE_AUTO_DETECTION,
+    ENABLE_DEPTH,
     ENABLE_DISPLAY,
     ENDPOINT,
     FRAME_HEIGHT,
+    FRAME_QUEUE_SIZE,
     FRAME_RATE,
     FRAME_WIDTH,
+    INFERENCE_CPUS,
+    INFERENCE_HALF,
+    INFERENCE_SIZE,
     JPEG_QUALITY_SNAPSHOT,
     JPEG_QUALITY_STREAM,
     MODEL_PATH,
     SEND_INTERVAL,
+    SEND_QUEUE_SIZE,
     SUPABASE_ANON_KEY,
+    WARMUP_RUNS,
     WINDOW_NAME,
 )
 from cleanup_utils import cleanup_on_startup
 from detection_analyzer import analyze_detection_with_crops, summarize_detections
-from image_processing import draw_detections
+from image_processing import (
+    build_label_styles,
+    draw_detections,
+    encode_frame_to_jpeg,
+    save_frames_from_detections,
+    save_full_frame,
+)
 from supabase_client import SupabaseDetectionWriter
-from utils import iso_now, logger
+from utils import (
+    boxes_to_arrays,
+    build_class_kinds,
+    create_http_session,
+    iso_now,
+    json_dumps,
+    logger,
+    second_timestamp,
+    set_thread_affinity,
+)
 
 
 @dataclass
@@ -55,6 +81,8 @@ class SharedState:
     latest_frame: Optional[np.ndarray] = None
     latest_jpeg_buffer: Optional[bytes] = None  # Pre-encoded JPEG for streaming
     latest_timestamp: float = 0.0
+    frame_seq: int = 0  # Incremented for every published frame
+    dropped_frames: int = 0  # Captured frames replaced before inference picked them up
     status: str = "noObjects"
     confidence: Optional[float] = None
     object_count: int = 0
@@ -65,31 +93,72 @@ class SharedState:
     supabase_last_error: Optional[str] = field(default=None)
 
 
+def resolve_model_path(model_path: str) -> str:
+    """Prefer an exported runtime (TensorRT engine, NCNN) next to .pt weights."""
+    path = Path(model_path)
+    if path.suffix != ".pt":
+        return model_path
+    for candidate in (path.with_suffix(".engine"), path.with_name(f"{path.stem}_ncnn_model")):
+        if candidate.exists():
+            logger.info(f"Найдена экспортированная модель: {candidate}")
+            return str(candidate)
+    return model_path
+
+
 class DetectionService:
     """Main detection service for RealSense camera + YOLO inference."""
 
     def __init__(self) -> None:
-        if not Path(MODEL_PATH).exists():
+        model_path = resolve_model_path(MODEL_PATH)
+        if not Path(model_path).exists():
             logger.warning(
-                f"Модель '{MODEL_PATH}' не найдена — попробуем загрузить, но убедитесь в пути."
+                f"Модель '{model_path}' не найдена — попробуем загрузить, но убедитесь в пути."
             )
-        logger.info(f"Загрузка YOLO модели: {MODEL_PATH}")
-        self.model = YOLO(MODEL_PATH, task="detect")
+        logger.info(f"Загрузка YOLO модели: {model_path}")
+        self.model = YOLO(model_path, task="detect")
+        self._predict_args = {"imgsz": INFERENCE_SIZE, "half": INFERENCE_HALF, "verbose": False}
         self.labels = self.model.names
+        self.class_kinds = build_class_kinds(self.labels)
+        self.label_styles = build_label_styles(self.labels)
         logger.debug(f"Загружены классы: {self.labels}")
+        self._warmup()
 
         self.pipeline = rs.pipeline()
         self.cfg = rs.config()
+        self.yuyv = COLOR_FORMAT == "yuyv"
+        color_format = rs.format.yuyv if self.yuyv else rs.format.bgr8
         self.cfg.enable_stream(
-            rs.stream.color, FRAME_WIDTH, FRAME_HEIGHT, rs.format.bgr8, FRAME_RATE
+            rs.stream.color, FRAME_WIDTH, FRAME_HEIGHT, color_format, FRAME_RATE
         )
-        self.align = rs.align(rs.stream.color)
+        if ENABLE_DEPTH:
+            # Off by default: depth frames cost USB bandwidth and are never consumed
+            self.cfg.enable_stream(
+                rs.stream.depth, FRAME_WIDTH, FRAME_HEIGHT, rs.format.z16, FRAME_RATE
+            )
+        # Alignment reprojects every depth pixel; only worth it when depth is captured
+        self.align = rs.align(rs.stream.color) if ENABLE_DEPTH else None
 
         self.state = SharedState()
         self.lock = threading.Lock()
+        self.frame_ready = threading.Condition(self.lock)
+        # Guards state.latest_frame and the back buffer only, so multi-MB reader
+        # copies never hold up status/stream readers on self.lock
+        self.frame_lock = threading.Lock()
         self.stop_event = threading.Event()
-        self.worker: Optional[threading.Thread] = None
-        self.session = requests.Session()
+        self.workers: List[threading.Thread] = []
+        self.frame_queue: "queue.Queue[tuple]" = queue.Queue(maxsize=FRAME_QUEUE_SIZE)
+        self.send_queue: "queue.Queue[tuple]" = queue.Queue(maxsize=SEND_QUEUE_SIZE)
+        # Annotation back buffer, swapped with state.latest_frame on publish
+        self._back_frame: Optional[np.ndarray] = None
+        # (frame_seq, jpeg) of the last snapshot-quality encode
+        self._snapshot_cache: Tuple[int, Optional[bytes]] = (-1, None)
+        self.session = create_http_session()
+        # Content-Type (multipart boundary) is set by requests per call
+        self._base_headers = {
+            "Authorization": f"Bearer {SUPABASE_ANON_KEY}",
+            "apikey": SUPABASE_ANON_KEY,
+            "X-Raspberry-Pi-Key": API_KEY,
+        }
         self.last_send_ts = 0.0
         self.supabase_writer = SupabaseDetectionWriter(session=self.session)
         if self.supabase_writer.is_enabled():
@@ -105,19 +174,37 @@ class DetectionService:
     # -----------------------
     # Жизненный цикл
     # -----------------------
+    def _warmup(self) -> None:
+        """Run dummy inferences and a JPEG encode so first-frame setup costs are paid at startup."""
+        if WARMUP_RUNS <= 0:
+            return
+        dummy = np.zeros((FRAME_HEIGHT, FRAME_WIDTH, 3), dtype=np.uint8)
+        t0 = time.perf_counter()
+        for _ in range(WARMUP_RUNS):
+            self.model(dummy, **self._predict_args)
+        encode_frame_to_jpeg(dummy, JPEG_QUALITY_STREAM)
+        logger.info(f"Прогрев модели завершён за {time.perf_counter() - t0:.2f} с")
+
     def start(self) -> None:
         """Start the detection service."""
         self._start_pipeline()
-        self.worker = threading.Thread(
-            target=self._loop, name="detection-loop", daemon=True
-        )
-        self.worker.start()
+        if INFERENCE_CPUS and hasattr(os, "sched_getaffinity"):
+            # Flask, capture and upload threads inherit the cores left over
+            set_thread_affinity(os.sched_getaffinity(0) - INFERENCE_CPUS)
+        self.workers = [
+            threading.Thread(target=self._capture_loop, name="capture-loop", daemon=True),
+            threading.Thread(target=self._loop, name="detection-loop", daemon=True),
+            threading.Thread(target=self._upload_loop, name="upload-loop", daemon=True),
+        ]
+        for worker in self.workers:
+            worker.start()
 
     def stop(self) -> None:
         """Stop the detection service."""
         self.stop_event.set()
-        if self.worker and self.worker.is_alive():
-            self.worker.join(timeout=5.0)
+        for worker in self.workers:
+            if worker.is_alive() and worker is not threading.current_thread():
+                worker.join(timeout=5.0)
         try:
             self.pipeline.stop()
         except RuntimeError:
@@ -130,7 +217,8 @@ class DetectionService:
         """Start RealSense pipeline with auto-retry."""
         for attempt in range(max_retries):
             try:
-                self.pipeline.start(self.cfg)
+                profile = self.pipeline.start(self.cfg)
+                self._limit_sensor_queue(profile)
                 logger.info(
                     f"RealSense pipeline запущен {FRAME_WIDTH}x{FRAME_HEIGHT}@{FRAME_RATE}"
                 )
@@ -150,28 +238,32 @@ class DetectionService:
                         f"Не удалось запустить RealSense pipeline: {exc}"
                     ) from exc
 
+    @staticmethod
+    def _limit_sensor_queue(profile) -> None:
+        """Keep only the freshest frame in the color sensor queue (no stale backlog)."""
+        try:
+            sensor = profile.get_device().first_color_sensor()
+            if sensor.supports(rs.option.frames_queue_size):
+                sensor.set_option(rs.option.frames_queue_size, 1)
+        except RuntimeError as exc:
+            logger.debug(f"frames_queue_size не поддерживается: {exc}")
+
     # -----------------------
     # Основной цикл
     # -----------------------
-    def _loop(self) -> None:
-        """Main detection loop."""
-        fps_value = FRAME_RATE
-        smoothing = 0.9
+    def _capture_loop(self) -> None:
+        """Capture stage: read RealSense frames and hand them to inference."""
         consecutive_errors = 0
         max_consecutive_errors = 10
 
-        logger.info("Запуск основного цикла детекции")
-
-        # Create OpenCV window if display is enabled
-        if ENABLE_DISPLAY:
-            cv2.namedWindow(WINDOW_NAME, cv2.WINDOW_AUTOSIZE)
-            logger.debug(f"OpenCV window '{WINDOW_NAME}' created")
+        logger.info("Запуск потока захвата кадров")
 
         while not self.stop_event.is_set():
             try:
                 frames = self.pipeline.wait_for_frames(timeout_ms=5000)
-                aligned = self.align.process(frames)
-                color_frame = aligned.get_color_frame()
+                if self.align is not None:
+                    frames = self.align.process(frames)
+                color_frame = frames.get_color_frame()
                 if not color_frame:
                     logger.warning("Нет цветового кадра")
                     consecutive_errors += 1
@@ -186,27 +278,92 @@ class DetectionService:
                 # Reset error counter on success
                 consecutive_errors = 0
 
-                frame = np.asanyarray(color_frame.get_data())
+                if self.yuyv:
+                    # Raw YUYV from the camera; OpenCV's NEON path converts to BGR
+                    raw = np.frombuffer(color_frame.get_data(), dtype=np.uint8).reshape(
+                        color_frame.get_height(), color_frame.get_width(), 2
+                    )
+                    frame = cv2.cvtColor(raw, cv2.COLOR_YUV2BGR_YUYV)
+                    # The BGR copy owns its pixels: the un-kept librealsense frame is not
+                    # handed to the inference thread (frames_queue_size is 1)
+                    owner = None
+                else:
+                    # Zero-copy view into the librealsense buffer; keep() holds the frame
+                    # memory across threads until the last reference to it is dropped
+                    color_frame.keep()
+                    frame = np.asanyarray(color_frame.get_data())
+                    owner = color_frame
+                if self._put_latest(self.frame_queue, (owner, frame)):
+                    # Inference is slower than the camera: the stale frame was replaced
+                    self.state.dropped_frames += 1
+
+            except RuntimeError as exc:
+                consecutive_errors += 1
+                logger.error(
+                    f"Ошибка получения кадра ({consecutive_errors}/{max_consecutive_errors}): {exc}"
+                )
+
+                if consecutive_errors >= max_consecutive_errors:
+                    logger.error(
+                        "Слишком много ошибок подряд, переподключаем камеру..."
+                    )
+                    self._reconnect_camera()
+                    consecutive_errors = 0
+
+                time.sleep(1.0)
+
+    def _loop(self) -> None:
+        """Inference stage: run YOLO, annotate, publish state and queue uploads."""
+        fps_value = FRAME_RATE
+        smoothing = 0.9
+
+        logger.info("Запуск основного цикла детекции")
+        if set_thread_affinity(INFERENCE_CPUS):
+            logger.info(f"Поток детекции закреплён за CPU {sorted(INFERENCE_CPUS)}")
+
+        # Create OpenCV window if display is enabled
+        if ENABLE_DISPLAY:
+            cv2.namedWindow(WINDOW_NAME, cv2.WINDOW_AUTOSIZE)
+            logger.debug(f"OpenCV window '{WINDOW_NAME}' created")
+
+        while not self.stop_event.is_set():
+            try:
+                # color_frame owns the buffer `frame` views (None for converted YUYV frames);
+                # it stays referenced for this iteration
+                color_frame, frame = self.frame_queue.get(timeout=1.0)
+            except queue.Empty:
+                continue
+
+            try:
                 inference_t0 = time.perf_counter()
-                results = self.model(frame, verbose=False)
-                boxes = results[0].boxes if results else None
-                status, confidence, count = summarize_detections(boxes, self.labels)
+                results = self.model(frame, **self._predict_args)
+                # One device-to-host transfer, shared by summarize, draw and save
+                detections = boxes_to_arrays(
+                    results[0].boxes if results else None, CONF_THRESHOLD
+                )
+                status, confidence, count = summarize_detections(detections, self.class_kinds)
                 inference_dt = time.perf_counter() - inference_t0
                 if inference_dt > 0:
                     fps_value = smoothing * fps_value + (1 - smoothing) * (
                         1.0 / inference_dt
                     )
 
+                # %-style args: formatting is deferred until DEBUG is actually enabled
                 logger.debug(
-                    f"Frame processed: status={status}, conf={confidence}, count={count}, fps={fps_value:.2f}"
+                    "Frame processed: status=%s, conf=%s, count=%s, fps=%.2f",
+                    status,
+                    confidence,
+                    count,
+                    fps_value,
                 )
 
-                # Create display frame with annotations (for OpenCV window and MJPEG streaming)
-                display_frame = frame.copy()
-                if boxes is not None and len(boxes) > 0:
-                    visual_count = draw_detections(display_frame, boxes, self.labels)
-                else:
-                    visual_count = 0
+                # Create display frame with annotations (for OpenCV window and MJPEG streaming).
+                # Drawn into the back buffer, so no per-frame allocation.
+                display_frame = self._back_frame
+                if display_frame is None or display_frame.shape != frame.shape:
+                    display_frame = np.empty_like(frame)
+                np.copyto(display_frame, frame)
+                visual_count = draw_detections(display_frame, detections, self.label_styles)
 
                 # Add FPS and object count overlay
                 cv2.putText(
@@ -229,14 +386,18 @@ class DetectionService:
                 )
 
                 # Pre-encode JPEG for streaming (encode once, reuse for all clients)
-                success, jpeg_buffer = cv2.imencode(
-                    ".jpg", display_frame, [int(cv2.IMWRITE_JPEG_QUALITY), JPEG_QUALITY_STREAM]
-                )
-                jpeg_bytes = jpeg_buffer.tobytes() if success else None
+                try:
+                    jpeg_bytes = encode_frame_to_jpeg(display_frame, JPEG_QUALITY_STREAM)
+                except RuntimeError:
+                    jpeg_bytes = None
 
-                # Update shared state with display frame and cached JPEG (for streaming)
+                # Readers copy under frame_lock, so the old front frame is free to reuse
+                with self.frame_lock:
+                    self._back_frame = self.state.latest_frame
+                    self.state.latest_frame = display_frame
+
+                # Update shared state with cached JPEG (for streaming) and status
                 with self.lock:
-                    self.state.latest_frame = display_frame.copy()
                     self.state.latest_jpeg_buffer = jpeg_bytes
                     self.state.latest_timestamp = time.time()
                     self.state.status = status
@@ -244,6 +405,8 @@ class DetectionService:
                     self.state.object_count = count
                     self.state.avg_fps = fps_value
                     self.state.last_send_error = None
+                    self.state.frame_seq += 1
+                    self.frame_ready.notify_all()
 
                 # Show in OpenCV window if enabled
                 if ENABLE_DISPLAY:
@@ -251,12 +414,8 @@ class DetectionService:
 
                 # Keyboard controls (only when display is enabled)
                 if ENABLE_DISPLAY:
-                    from image_processing import (
-                        save_frames_from_detections,
-                        save_full_frame,
-                    )
-
-                    key = cv2.waitKey(5) & 0xFF
+                    # 1 ms is enough to pump GUI events without stalling the loop
+                    key = cv2.waitKey(1) & 0xFF
 
                     if key == ord("q") or key == ord("Q"):
                         logger.info("Quit key pressed - stopping service")
@@ -281,26 +440,20 @@ class DetectionService:
                         save_full_frame(display_frame)
 
                     elif key == ord("f") or key == ord("F"):  # Save crops
-                        save_frames_from_detections(frame, boxes, self.labels)
+                        save_frames_from_detections(frame, detections, self.class_kinds)
 
-                # Automatic detection sending (controlled by RS_ENABLE_AUTO_DETECTION env var)
+                # Automatic detection sending (controlled by RS_ENABLE_AUTO_DETECTION env var).
+                # The upload runs on its own thread so the next frame's inference overlaps it.
                 if ENABLE_AUTO_DETECTION and self._should_send():
-                    self._send_detection(frame.copy(), status, confidence, count, fps_value)
-
-            except RuntimeError as exc:
-                consecutive_errors += 1
-                logger.error(
-                    f"Ошибка получения кадра ({consecutive_errors}/{max_consecutive_errors}): {exc}"
-                )
-
-                if consecutive_errors >= max_consecutive_errors:
-                    logger.error(
-                        "Слишком много ошибок подряд, переподключаем камеру..."
-                    )
-                    self._reconnect_camera()
-                    consecutive_errors = 0
-
-                time.sleep(1.0)
+                    # Copy: the upload outlives this iteration's RealSense frame.
+                    # Newest wins on back-pressure, like the capture queue.
+                    if self._put_latest(
+                        self.send_queue, (frame.copy(), status, confidence, count, fps_value)
+                    ):
+                        logger.warning(
+                            "Очередь отправки переполнена, самая старая детекция отброшена"
+                        )
+                    self.last_send_ts = time.time()
 
             except Exception as exc:  # pylint: disable=broad-except
                 with self.lock:
@@ -310,6 +463,40 @@ class DetectionService:
                 )
                 time.sleep(1.0)
 
+    def _upload_loop(self) -> None:
+        """Upload stage: send queued detections to the cloud."""
+        logger.info("Запуск потока отправки детекций")
+
+        while not self.stop_event.is_set():
+            try:
+                item = self.send_queue.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            try:
+                self._send_detection(*item)
+            except Exception as exc:  # pylint: disable=broad-except
+                with self.lock:
+                    self.state.last_send_error = str(exc)
+                logger.error(f"Ошибка в потоке отправки: {exc}", exc_info=True)
+
+    @staticmethod
+    def _put_latest(q: "queue.Queue", item: object) -> bool:
+        """Put item into a bounded queue, dropping the oldest entry when full.
+
+        Returns True if an entry was dropped.
+        """
+        dropped = False
+        while True:
+            try:
+                q.put_nowait(item)
+                return dropped
+            except queue.Full:
+                try:
+                    q.get_nowait()
+                    dropped = True
+                except queue.Empty:
+                    pass
+
     def _reconnect_camera(self) -> None:
         """Reconnect RealSense camera after errors."""
         logger.info("Попытка переподключения камеры...")
@@ -347,8 +534,6 @@ class DetectionService:
         fps_value: float,
     ) -> None:
         """Send detection to cloud (automatic sending - currently disabled)."""
-        from image_processing import encode_frame_to_base64
-
         lovable_enabled = bool(
             ENDPOINT and API_KEY and DEVICE_ID and SUPABASE_ANON_KEY
         )
@@ -356,21 +541,19 @@ class DetectionService:
         if not lovable_enabled and not supabase_enabled:
             return
 
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        timestamp = second_timestamp()
         try:
-            main_image = encode_frame_to_base64(frame, f"{timestamp}.jpg")
+            main_jpeg = encode_frame_to_jpeg(frame)
         except RuntimeError as exc:
             with self.lock:
                 self.state.last_send_error = str(exc)
             logger.error(f"Не удалось подготовить кадр для отправки: {exc}")
             return
 
-        main_image_data = main_image.get("data")
         payload = {
             "device_id": DEVICE_ID,
             "status": status,
             "confidence": round(confidence, 2) if confidence is not None else None,
-            "main_image": main_image_data,
             "metadata": {
                 "objectCount": count,
                 "avgFps": round(fps_value, 2),
@@ -378,36 +561,33 @@ class DetectionService:
             },
         }
 
-        headers = {
-            "Authorization": f"Bearer {SUPABASE_ANON_KEY}",
-            "apikey": SUPABASE_ANON_KEY,
-            "X-Raspberry-Pi-Key": API_KEY,
-            "Content-Type": "application/json",
-        }
+        headers = self._base_headers
 
-        # Debug logging для диагностики авторизации
-        logger.debug("=== SEND DETECTION DEBUG INFO ===")
-        logger.debug(f"DEVICE_ID: {DEVICE_ID}")
-        logger.debug(f"ENDPOINT: {ENDPOINT}")
-        if API_KEY:
-            logger.debug("API_KEY present: True")
-        else:
+        if not API_KEY:
             logger.warning("API_KEY is None! Check environment variables.")
-        logger.debug(f"SUPABASE_ANON_KEY present: {SUPABASE_ANON_KEY is not None}")
-        if SUPABASE_ANON_KEY:
-            logger.debug(
-                f"SUPABASE_ANON_KEY (first 20 chars): {SUPABASE_ANON_KEY[:20]}..."
-            )
-        logger.debug(f"Headers keys: {list(headers.keys())}")
-        logger.debug("=================================")
+
+        # Debug logging для диагностики авторизации
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("=== SEND DETECTION DEBUG INFO ===")
+            logger.debug(f"DEVICE_ID: {DEVICE_ID}")
+            logger.debug(f"ENDPOINT: {ENDPOINT}")
+            logger.debug(f"API_KEY present: {bool(API_KEY)}")
+            logger.debug(f"SUPABASE_ANON_KEY present: {SUPABASE_ANON_KEY is not None}")
+            if SUPABASE_ANON_KEY:
+                logger.debug(
+                    f"SUPABASE_ANON_KEY (first 20 chars): {SUPABASE_ANON_KEY[:20]}..."
+                )
+            logger.debug(f"Headers keys: {list(headers.keys())}")
+            logger.debug("=================================")
 
         lovable_response: Optional[Dict[str, object]] = None
         lovable_error: Optional[str] = None
 
         if lovable_enabled:
             try:
+                data, files = self._build_multipart(payload, main_jpeg, [])
                 response = self.session.post(
-                    ENDPOINT, headers=headers, json=payload, timeout=30
+                    ENDPOINT, headers=headers, data=data, files=files, timeout=30
                 )
                 response.raise_for_status()
                 lovable_response = (
@@ -430,31 +610,43 @@ class DetectionService:
                 elif lovable_error is not None:
                     self.state.last_send_error = lovable_error
 
-        self._send_supabase(payload, main_image, timestamp)
+        self._send_supabase(payload, main_jpeg, timestamp)
         self.last_send_ts = time.time()
 
     # -----------------------
     # Методы для HTTP
     # -----------------------
     def get_snapshot(self) -> Optional[bytes]:
-        """Get latest frame as JPEG bytes for /snapshot endpoint."""
+        """Get latest frame as JPEG bytes for /snapshot endpoint.
+
+        Reuses the stream JPEG when both qualities match; otherwise encodes at
+        snapshot quality at most once per published frame.
+        """
         with self.lock:
-            frame = (
-                None if self.state.latest_frame is None else self.state.latest_frame.copy()
-            )
-        if frame is None:
+            if JPEG_QUALITY_SNAPSHOT == JPEG_QUALITY_STREAM:
+                return self.state.latest_jpeg_buffer
+            seq = self.state.frame_seq
+            cached_seq, cached_jpeg = self._snapshot_cache
+            if cached_seq == seq:
+                return cached_jpeg
+        with self.frame_lock:
+            if self.state.latest_frame is None:
+                return None
+            frame = self.state.latest_frame.copy()
+        try:
+            jpeg = encode_frame_to_jpeg(frame, JPEG_QUALITY_SNAPSHOT)
+        except RuntimeError:
             return None
-        success, buffer = cv2.imencode(
-            ".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), JPEG_QUALITY_SNAPSHOT]
-        )
-        return buffer.tobytes() if success else None
+        with self.lock:
+            self._snapshot_cache = (seq, jpeg)
+        return jpeg
 
     def get_latest_frame_copy(self) -> Optional[np.ndarray]:
         """Get a copy of the latest frame (for MJPEG streaming).
 
         DEPRECATED: Use get_cached_jpeg_stream() instead for better performance.
         """
-        with self.lock:
+        with self.frame_lock:
             return (
                 None if self.state.latest_frame is None else self.state.latest_frame.copy()
             )
@@ -464,6 +656,19 @@ class DetectionService:
         with self.lock:
             return self.state.latest_jpeg_buffer
 
+    def wait_for_jpeg_stream(
+        self, last_seq: int, timeout: float = 1.0
+    ) -> Tuple[int, Optional[bytes]]:
+        """Block until a frame newer than last_seq is published (for MJPEG streaming).
+
+        Returns (seq, jpeg); on timeout the current frame is returned again.
+        """
+        with self.frame_ready:
+            self.frame_ready.wait_for(
+                lambda: self.state.frame_seq != last_seq, timeout=timeout
+            )
+            return self.state.frame_seq, self.state.latest_jpeg_buffer
+
     def get_status(self) -> Dict[str, object]:
         """Get current detection status for /status endpoint."""
         with self.lock:
@@ -473,6 +678,7 @@ class DetectionService:
                 "confidence": self.state.confidence,
                 "objectCount": self.state.object_count,
                 "avgFps": round(self.state.avg_fps, 2),
+                "droppedFrames": self.state.dropped_frames,
                 "lastFrameTs": self.state.latest_timestamp,
                 "lastSendResponse": self.state.last_send_response,
                 "lastSendError": self.state.last_send_error,
@@ -484,7 +690,7 @@ class DetectionService:
 
     def trigger_detection(self, user_token: Optional[str] = None) -> Dict[str, object]:
         """Manually trigger detection and send to cloud immediately."""
-        with self.lock:
+        with self.frame_lock:
             # Get the original frame (without annotations) for fresh YOLO inference
             frame = (
                 None if self.state.latest_frame is None else self.state.latest_frame.copy()
@@ -495,14 +701,23 @@ class DetectionService:
 
         try:
             # Run fresh YOLO inference on the frame
-            results = self.model(frame, verbose=False)
-            boxes = results[0].boxes if results else None
+            results = self.model(frame, **self._predict_args)
+            detections = boxes_to_arrays(
+                results[0].boxes if results else None, CONF_THRESHOLD
+            )
 
-            # Use new analysis function to get crops and detailed statuses
-            analysis = analyze_detection_with_crops(frame, boxes, self.labels)
+            # Use new analysis function to get crops and detailed statuses.
+            # Without cloud credentials nothing is uploaded, so empty scenes skip encoding.
+            cloud_enabled = bool(ENDPOINT and API_KEY and DEVICE_ID and SUPABASE_ANON_KEY)
+            analysis = analyze_detection_with_crops(
+                frame, detections, self.class_kinds, encode_on_empty=cloud_enabled
+            )
 
             # Send detection with plant images and statuses
-            self._send_detection_with_crops(analysis, user_token=user_token)
+            if cloud_enabled:
+                self._send_detection_with_crops(analysis, user_token=user_token)
+            else:
+                logger.warning("Cloud submission not enabled - missing credentials")
 
             return {
                 "success": True,
@@ -518,44 +733,35 @@ class DetectionService:
     def _send_detection_with_crops(
         self, analysis: Dict[str, object], user_token: Optional[str] = None
     ) -> None:
-        """Send detection with plant crops and individual statuses to cloud."""
-        lovable_enabled = bool(
-            ENDPOINT and API_KEY and DEVICE_ID and SUPABASE_ANON_KEY
-        )
-        if not lovable_enabled:
-            logger.warning("Cloud submission not enabled - missing credentials")
-            return
-
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        """Send detection with plant crops and individual statuses to cloud.
 
+        The caller checks that cloud credentials are configured.
+        """
         # Prepare metadata with plant statuses
         metadata = {
             "objectCount": len(analysis["plant_statuses"]),
             "created_at": iso_now(),
-            "plant_statuses": analysis["plant_statuses"],
+            "plant_statuses": [asdict(p) for p in analysis["plant_statuses"]],
         }
 
         payload = {
             "device_id": DEVICE_ID,
             "status": analysis["overall_status"],
             "confidence": analysis["confidence"],
-            "main_image": analysis["main_image_b64"],
-            "plant_images": analysis["plant_images_b64"],
             "metadata": metadata,
         }
 
         # Use user token if provided, otherwise use anon key
-        auth_token = user_token if user_token else SUPABASE_ANON_KEY
-        headers = {
-            "Authorization": f"Bearer {auth_token}",
-            "apikey": SUPABASE_ANON_KEY,
-            "X-Raspberry-Pi-Key": API_KEY,
-            "Content-Type": "application/json",
-        }
+        headers = self._base_headers
+        if user_token:
+            headers = {**headers, "Authorization": f"Bearer {user_token}"}
 
         try:
+            data, files = self._build_multipart(
+                payload, analysis["main_image_jpeg"], analysis["plant_images_jpeg"]
+            )
             response = self.session.post(
-                ENDPOINT, headers=headers, json=payload, timeout=30
+                ENDPOINT, headers=headers, data=data, files=files, timeout=30
             )
             response.raise_for_status()
             lovable_response = (
@@ -576,8 +782,25 @@ class DetectionService:
             with self.lock:
                 self.state.last_send_error = str(exc)
 
+    @staticmethod
+    def _build_multipart(
+        payload: Dict[str, object], main_jpeg: bytes, plant_jpegs: List[bytes]
+    ) -> Tuple[Dict[str, str], List[Tuple[str, Tuple[str, bytes, str]]]]:
+        """Build multipart/form-data fields and raw JPEG parts for submit-detection."""
+        confidence = payload.get("confidence")
+        data = {
+            "device_id": str(payload.get("device_id")),
+            "status": str(payload.get("status")),
+            "confidence": "" if confidence is None else str(confidence),
+            "metadata": json_dumps(payload.get("metadata") or {}).decode("utf-8"),
+        }
+        files = [("main_image", ("main.jpg", main_jpeg, "image/jpeg"))]
+        for idx, plant_jpeg in enumerate(plant_jpegs, start=1):
+            files.append(("plant_images", (f"plant_{idx}.jpg", plant_jpeg, "image/jpeg")))
+        return data, files
+
     def _send_supabase(
-        self, payload: Dict[str, object], main_image: Dict[str, str], timestamp: str
+        self, payload: Dict[str, object], main_jpeg: bytes, timestamp: str
     ) -> None:
         """Send detection directly to Supabase (if configured)."""
         if not self.supabase_writer.is_enabled():
@@ -597,7 +820,7 @@ class DetectionService:
         try:
             result = self.supabase_writer.send_detection(
                 payload=supabase_payload,
-                base64_image=main_image.get("data"),
+                image_bytes=main_jpeg,
                 filename=f"{timestamp}.jpg",
             )
             with self.lock:
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Export trained YOLO weights (best.pt) to a Pi-friendly runtime format.
+
+INT8 quantization (TFLite / OpenVINO / TensorRT) needs a calibration dataset YAML.
+NCNN export supports FP16 weights only (--half).
+TensorRT engines (--format engine) need an NVIDIA GPU (Jetson); the Pi uses NCNN.
+The service picks up best.engine / best_ncnn_model automatically when
+YOLO_MODEL_PATH points at best.pt.
+
+Examples:
+    python3 export_model.py --format ncnn --half
+    python3 export_model.py --format engine --half --imgsz 320   # Jetson
+    python3 export_model.py --format tflite --int8 --data calib.yaml
+
+Point YOLO_MODEL_PATH at the printed output path to use the exported model.
+"""
+import argparse
+
+from ultralytics import YOLO
+
+from config import SCRIPT_DIR
+from utils import logger
+
+INT8_FORMATS = {"tflite", "openvino", "engine"}
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--weights", default=str(SCRIPT_DIR / "best.pt"), help="Path to .pt weights"
+    )
+    parser.add_argument(
+        "--format", default="ncnn", choices=["ncnn", "tflite", "openvino", "onnx", "engine"]
+    )
+    parser.add_argument("--imgsz", type=int, default=640, help="Inference image size")
+    parser.add_argument("--half", action="store_true", help="FP16 weights")
+    parser.add_argument("--int8", action="store_true", help="INT8 quantization")
+    parser.add_argument("--data", default=None, help="Calibration dataset YAML (INT8)")
+    return parser.parse_args()
+
+
+def main() -> None:
+    """Export model with the requested precision."""
+    args = parse_args()
+    if args.int8 and args.format not in INT8_FORMATS:
+        raise SystemExit(
+            f"INT8 export is supported only for: {', '.join(sorted(INT8_FORMATS))}"
+        )
+    if args.int8 and not args.data:
+        raise SystemExit("INT8 export requires --data with a calibration dataset")
+
+    logger.info(f"Exporting {args.weights} -> {args.format} (half={args.half}, int8={args.int8})")
+    model = YOLO(args.weights, task="detect")
+    output = model.export(
+        format=args.format,
+        imgsz=args.imgsz,
+        half=args.half,
+        int8=args.int8,
+        data=args.data,
+    )
+    logger.info(f"Export complete: {output}")
+    logger.info(f"Use it with: export YOLO_MODEL_PATH={output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,8 +3,6 @@ Flask HTTP server for YOLO Detection Service.
 
 Provides HTTP endpoints for snapshot, status, detection triggering, and MJPEG streaming.
 """
-import time
-
 from flask import Flask, Response, jsonify, request
 
 from detection_service import DetectionService
@@ -23,6 +21,10 @@ ALLOWED_ORIGINS = [
     "http://localhost:3000",
 ]
 
+# MJPEG part framing, yielded around each pre-encoded JPEG
+MJPEG_PART_HEADER = b"--frame\r\nContent-Type: image/jpeg\r\n\r\n"
+MJPEG_PART_FOOTER = b"\r\n"
+
 
 @app.after_request
 def add_cors_headers(response):
@@ -84,19 +86,18 @@ def stream():
     """MJPEG streaming endpoint for real-time video (optimized with pre-encoded JPEG cache)."""
 
     def generate():
+        seq = 0
         while True:
-            # Use cached JPEG buffer (pre-encoded in detection loop)
-            jpeg_bytes = service.get_cached_jpeg_stream()
+            # Wait for the next pre-encoded JPEG from the detection loop (no polling);
+            # on timeout the last frame is re-sent, which keeps the connection alive
+            seq, jpeg_bytes = service.wait_for_jpeg_stream(seq)
             if jpeg_bytes is None:
-                time.sleep(0.1)
                 continue
 
-            yield (
-                b"--frame\r\n"
-                b"Content-Type: image/jpeg\r\n\r\n" + jpeg_bytes + b"\r\n"
-            )
-            # No artificial delay - frames sent as fast as available
-            # No JPEG encoding overhead - using pre-encoded buffer
+            # Yielded separately so the JPEG is never copied into a new bytes object
+            yield MJPEG_PART_HEADER
+            yield jpeg_bytes
+            yield MJPEG_PART_FOOTER
 
     return Response(generate(), mimetype="multipart/x-mixed-replace; boundary=frame")
 
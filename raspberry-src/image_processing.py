@@ -3,117 +3,237 @@ Image processing functions for YOLO Detection Service.
 
 Contains functions for encoding, drawing, and saving images.
 """
-import base64
-from typing import Dict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Tuple
 
 import cv2
 import numpy as np
 
-from config import BBOX_COLORS, CONF_THRESHOLD, JPEG_QUALITY_SNAPSHOT, STREAMSCAN_DIR, STREAMFRAME_DIR
-from utils import logger, safe_bbox_coords, timestamp_str
-
-
-def encode_frame_to_base64(frame: np.ndarray, filename: str) -> Dict[str, str]:
-    """Encode frame to base64 JPEG string."""
-    success, buffer = cv2.imencode(
-        ".jpg", frame, [int(cv2.IMWRITE_JPEG_QUALITY), JPEG_QUALITY_SNAPSHOT]
-    )
+try:
+    from turbojpeg import TJPF_BGR, TJSAMP_420, TurboJPEG  # NEON/SIMD libjpeg-turbo, optional
+
+    _turbo = TurboJPEG()
+except (ImportError, OSError, RuntimeError):  # package or libturbojpeg missing
+    _turbo = None
+
+try:
+    import simplejpeg  # libjpeg-turbo bundled in the wheel, no system library needed
+except ImportError:
+    simplejpeg = None
+
+from config import (
+    BBOX_COLORS,
+    JPEG_QUALITY_SNAPSHOT,
+    OPENCV_THREADS,
+    STREAMSCAN_DIR,
+    STREAMFRAME_DIR,
+)
+from utils import (
+    KIND_PLANT,
+    Detections,
+    clip_boxes,
+    logger,
+    timestamp_str,
+)
+
+# SIMD-dispatched kernels; some libraries switch this off on import
+cv2.setUseOptimized(True)
+# Worker threads for OpenCV's parallel_for_ (color conversion, resize)
+if OPENCV_THREADS > 0:
+    cv2.setNumThreads(OPENCV_THREADS)
+
+
+# cv2.imencode parameter lists, built once per JPEG quality
+_JPEG_PARAMS: Dict[int, List[int]] = {}
+
+
+def _jpeg_params(quality: int) -> List[int]:
+    """Return cached cv2.imencode parameters for the given JPEG quality."""
+    params = _JPEG_PARAMS.get(quality)
+    if params is None:
+        # Pin the fast path explicitly: standard Huffman tables, baseline, 4:2:0
+        params = [
+            int(cv2.IMWRITE_JPEG_QUALITY), quality,
+            int(cv2.IMWRITE_JPEG_OPTIMIZE), 0,
+            int(cv2.IMWRITE_JPEG_PROGRESSIVE), 0,
+        ]
+        if hasattr(cv2, "IMWRITE_JPEG_SAMPLING_FACTOR"):  # OpenCV >= 4.5.5
+            params += [
+                int(cv2.IMWRITE_JPEG_SAMPLING_FACTOR),
+                int(cv2.IMWRITE_JPEG_SAMPLING_FACTOR_420),
+            ]
+        _JPEG_PARAMS[quality] = params
+    return params
+
+
+def encode_frame_to_jpeg(frame: np.ndarray, quality: int = JPEG_QUALITY_SNAPSHOT) -> bytes:
+    """Encode frame to raw JPEG bytes in memory (snapshot quality by default).
+
+    Goes straight to libjpeg-turbo (BGR input, no conversion) when PyTurboJPEG or
+    simplejpeg is installed, otherwise through cv2.imencode.
+    """
+    if _turbo is not None:
+        return _turbo.encode(
+            np.ascontiguousarray(frame),
+            quality=quality,
+            pixel_format=TJPF_BGR,
+            jpeg_subsample=TJSAMP_420,
+        )
+    if simplejpeg is not None:
+        return simplejpeg.encode_jpeg(
+            np.ascontiguousarray(frame),
+            quality=quality,
+            colorspace="BGR",
+            colorsubsampling="420",
+        )
+    success, buffer = cv2.imencode(".jpg", frame, _jpeg_params(quality))
     if not success:
         raise RuntimeError("Не удалось закодировать кадр в JPEG.")
+    return buffer.tobytes()
+
+
+def jpeg_backend() -> str:
+    """Describe the JPEG codec in use (libjpeg-turbo expected)."""
+    if _turbo is not None:
+        return "PyTurboJPEG (libturbojpeg)"
+    if simplejpeg is not None:
+        return f"simplejpeg {simplejpeg.__version__} (bundled libjpeg-turbo)"
+    for line in cv2.getBuildInformation().splitlines():
+        name, _, value = line.strip().partition(":")
+        if name == "JPEG":
+            return value.strip()
+    return "unknown"
+
+
+def opencv_backend() -> str:
+    """Describe OpenCV's SIMD build (baseline + dispatched ISAs) and runtime settings."""
+    simd = {}
+    for line in cv2.getBuildInformation().splitlines():
+        name, _, value = line.strip().partition(":")
+        if name in ("Baseline", "Dispatched code generation"):
+            simd[name] = value.strip() or "-"
+    return (
+        f"{cv2.__version__}, baseline: {simd.get('Baseline', '?')}, "
+        f"dispatched: {simd.get('Dispatched code generation', '?')}, "
+        f"optimized={cv2.useOptimized()}, threads={cv2.getNumThreads()}"
+    )
+
+
+LabelStyles = Dict[int, Tuple[str, Tuple[int, int, int]]]
+
+
+def build_label_styles(labels: Dict) -> LabelStyles:
+    """Precompute the "name: " label prefix and box color for every class."""
     return {
-        "filename": filename,
-        "content_type": "image/jpeg",
-        "data": base64.b64encode(buffer.tobytes()).decode("ascii"),
+        class_idx: (f"{name}: ", BBOX_COLORS[class_idx % len(BBOX_COLORS)])
+        for class_idx, name in labels.items()
     }
 
 
-def draw_detections(frame: np.ndarray, boxes, labels_dict: Dict) -> int:
-    """Draw bounding boxes and labels on frame. Returns object count."""
-    if boxes is None or len(boxes) == 0:
+@lru_cache(maxsize=1024)
+def _label_size(label: str) -> Tuple[Tuple[int, int], int]:
+    """cv2.getTextSize for the label font; labels repeat (class x percent), so cache them."""
+    return cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)
+
+
+@lru_cache(maxsize=1024)
+def _label_sprite(label: str, color: Tuple[int, int, int]) -> np.ndarray:
+    """Render a label (filled box + text) once; pasted onto frames by _blit_sprite.
+
+    The box reaches down to the glyph descenders, so the sprite is fully opaque
+    and the text's anti-aliasing only ever blends with the box color.
+    """
+    (text_w, text_h), base_line = _label_size(label)
+    sprite = np.empty((text_h + base_line + 4, text_w + 1, 3), dtype=np.uint8)
+    sprite[:] = color
+    cv2.putText(sprite, label, (0, text_h + 3), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 0), 1)
+    return sprite
+
+
+def _blit_sprite(frame: np.ndarray, sprite: np.ndarray, x: int, y: int) -> None:
+    """Copy sprite onto frame with its top-left corner at (x, y), clipped to the frame."""
+    h, w = frame.shape[:2]
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + sprite.shape[1], w), min(y + sprite.shape[0], h)
+    if x0 < x1 and y0 < y1:
+        frame[y0:y1, x0:x1] = sprite[y0 - y:y1 - y, x0 - x:x1 - x]
+
+
+def draw_detections(frame: np.ndarray, detections: Detections, label_styles: LabelStyles) -> int:
+    """Draw thresholded detections on frame. Returns object count.
+
+    The xyxy array is clamped to the frame in place.
+    """
+    xyxy, confs, clss = detections
+    if len(confs) == 0:
         return 0
 
     object_count = 0
     h, w = frame.shape[:2]
 
-    for box in boxes:
-        conf = float(box.conf.item())
-        if conf < CONF_THRESHOLD:
-            continue
-
-        # Get bounding box coordinates
-        xyxy_tensor = box.xyxy.cpu()
-        xyxy = xyxy_tensor.numpy().squeeze()
-        xmin, ymin, xmax, ymax = xyxy.astype(int)
-        xmin, ymin, xmax, ymax = safe_bbox_coords(xmin, ymin, xmax, ymax, w, h)
+    # Clamp all boxes at once instead of per box
+    clip_boxes(xyxy, w, h)
 
+    for (xmin, ymin, xmax, ymax), conf, class_idx in zip(
+        xyxy.tolist(), confs.tolist(), clss.tolist()
+    ):
         # Get class info
-        class_idx = int(box.cls.item())
-        classname = labels_dict.get(class_idx, str(class_idx))
+        style = label_styles.get(class_idx)
+        if style is None:
+            style = (f"{class_idx}: ", BBOX_COLORS[class_idx % len(BBOX_COLORS)])
+        prefix, color = style
 
         # Draw rectangle with class-specific color
-        color = BBOX_COLORS[class_idx % len(BBOX_COLORS)]
         cv2.rectangle(frame, (xmin, ymin), (xmax, ymax), color, 2)
 
-        # Draw label background and text
-        label = f"{classname}: {int(conf * 100)}%"
-        label_size, base_line = cv2.getTextSize(
-            label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1
-        )
-        label_ymin = max(ymin, label_size[1] + 10)
-        cv2.rectangle(
-            frame,
-            (xmin, label_ymin - label_size[1] - 10),
-            (xmin + label_size[0], label_ymin + base_line - 10),
-            color,
-            cv2.FILLED,
-        )
-        cv2.putText(
-            frame,
-            label,
-            (xmin, label_ymin - 7),
-            cv2.FONT_HERSHEY_SIMPLEX,
-            0.5,
-            (0, 0, 0),
-            1,
-        )
+        # Label background and text: a pre-rendered sprite per distinct label
+        label = f"{prefix}{int(conf * 100)}%"
+        text_h = _label_size(label)[0][1]
+        label_top = max(ymin, text_h + 10) - text_h - 10
+        _blit_sprite(frame, _label_sprite(label, color), xmin, label_top)
         object_count += 1
 
     return object_count
 
 
+# Single writer thread: hotkey saves never block the detection loop on encode + disk I/O
+_SAVE_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix="image-save")
+
+
+def _write_jpeg(path: Path, image: np.ndarray, what: str) -> None:
+    """Encode and write one image (runs on the save thread)."""
+    try:
+        path.write_bytes(encode_frame_to_jpeg(image))
+    except Exception as exc:
+        logger.error(f"Failed to save {what} -> {path}: {exc}")
+        return
+    logger.info(f"Saved {what} -> {path}")
+
+
 def save_full_frame(frame: np.ndarray) -> None:
-    """Save full frame to StreamScan/ directory."""
-    fname = f"{timestamp_str()}.png"
+    """Save full frame to StreamScan/ directory as JPEG (in the background)."""
+    fname = f"{timestamp_str()}.jpg"
     path = STREAMSCAN_DIR / fname
-    cv2.imwrite(str(path), frame)
-    logger.info(f"Saved full frame -> {path}")
+    # Copy: the caller reuses its frame buffers on the next iteration
+    _SAVE_POOL.submit(_write_jpeg, path, frame.copy(), "full frame")
 
 
-def save_frames_from_detections(frame: np.ndarray, boxes, labels_dict: Dict) -> None:
-    """Save crops for detections whose class name contains 'chrysanthemum' to StreamFrame/ directory."""
-    if boxes is None or len(boxes) == 0:
+def save_frames_from_detections(
+    frame: np.ndarray, detections: Detections, class_kinds: np.ndarray
+) -> None:
+    """Save crops for chrysanthemum detections to StreamFrame/ directory (in the background)."""
+    xyxy, _, clss = detections
+    if len(clss) == 0:
         logger.info("No detections to save")
         return
 
-    saved = 0
     h, w = frame.shape[:2]
-    crops = []
 
     # Gather chrysanthemum detections
-    for box in boxes:
-        conf = float(box.conf.item())
-        if conf < CONF_THRESHOLD:
-            continue
-
-        class_idx = int(box.cls.item())
-        classname = labels_dict.get(class_idx, str(class_idx))
-
-        if "chrysanthemum" in classname.lower():
-            xyxy_tensor = box.xyxy.cpu()
-            xyxy = xyxy_tensor.numpy().squeeze()
-            xmin, ymin, xmax, ymax = xyxy.astype(int)
-            xmin, ymin, xmax, ymax = safe_bbox_coords(xmin, ymin, xmax, ymax, w, h)
-            crops.append((xmin, ymin, xmax, ymax, classname, conf))
+    keep = class_kinds[clss] == KIND_PLANT
+    crops = clip_boxes(xyxy[keep], w, h).tolist()
 
     if not crops:
         logger.info("No chrysanthemum detections to save")
@@ -121,13 +241,12 @@ def save_frames_from_detections(frame: np.ndarray, boxes, labels_dict: Dict) ->
 
     # Save crops with timestamp
     base_ts = timestamp_str()
-    for idx, (xmin, ymin, xmax, ymax, classname, conf) in enumerate(crops, start=1):
-        crop = frame[ymin:ymax, xmin:xmax]
+    for idx, (xmin, ymin, xmax, ymax) in enumerate(crops, start=1):
+        # Only the crop is copied, not the whole frame
+        crop = frame[ymin:ymax, xmin:xmax].copy()
         fname = f"{base_ts}"
         if len(crops) > 1:
             fname += f"-{idx}"
-        fname += ".png"
+        fname += ".jpg"
         path = STREAMFRAME_DIR / fname
-        cv2.imwrite(str(path), crop)
-        saved += 1
-        logger.info(f"Saved crop {saved} -> {path}")
+        _SAVE_POOL.submit(_write_jpeg, path, crop, f"crop {idx}")
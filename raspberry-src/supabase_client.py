@@ -1,22 +1,29 @@
 """Supabase helper for saving detection results.
 
-The Pi already posts base64 images to the Lovable Edge Function. This module
+The Pi already posts JPEG images to the Lovable Edge Function. This module
 provides an optional path to talk directly with Supabase Storage + REST APIs
 when the corresponding environment variables are present.
 """
 from __future__ import annotations
 
-import base64
 import json
 import os
 import time
 import uuid
 from dataclasses import dataclass
-from typing import Any, Dict, Iterable, Optional
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
 
 import requests
 
+try:
+    import pybase64 as base64  # SIMD-accelerated, drop-in compatible
+except ImportError:
+    import base64
+
+from utils import create_http_session, json_dumps, json_loads
+
 DEFAULT_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "15"))
+BATCH_SIZE = int(os.getenv("SUPABASE_BATCH_SIZE", "50"))  # Rows per insert when flushing
 
 
 def _read_env(name: str) -> Optional[str]:
@@ -48,7 +55,7 @@ class SupabaseDetectionWriter:
     """Send detection rows (and optional image uploads) to Supabase."""
 
     def __init__(self, session: Optional[requests.Session] = None) -> None:
-        self.session = session or requests.Session()
+        self.session = session or create_http_session()
         self.cfg = SupabaseConfig.from_env()
         self.storage_path_prefix = _read_env("SUPABASE_STORAGE_PREFIX") or "detections"
         self.pending_path = _read_env("SUPABASE_PENDING_PATH") or "pending_supabase.json"
@@ -60,18 +67,21 @@ class SupabaseDetectionWriter:
     def send_detection(
         self,
         payload: Dict[str, Any],
-        base64_image: Optional[str],
+        image_bytes: Optional[bytes],
         filename: str,
     ) -> Dict[str, Any]:
         if not self.cfg:
             return {"enabled": False}
         try:
-            return self._send_once(payload, base64_image, filename)
+            return self._send_once(payload, image_bytes, filename)
         except requests.RequestException as exc:
+            # Only the on-disk JSON cache needs the base64 form
             self._append_pending(
                 {
                     "payload": payload,
-                    "image_b64": base64_image,
+                    "image_b64": (
+                        base64.b64encode(image_bytes).decode("ascii") if image_bytes else None
+                    ),
                     "filename": filename,
                     "ts": time.time(),
                     "error": str(exc),
@@ -87,28 +97,100 @@ class SupabaseDetectionWriter:
             return []
         succeeded = []
         remaining = []
-        for entry in entries:
-            payload = entry.get("payload")
-            base64_image = entry.get("image_b64")
-            filename = entry.get("filename") or "pending.jpg"
-            try:
-                self._send_once(payload, base64_image, filename)
-                entry.setdefault("retries", 0)
-                succeeded.append(entry)
-            except requests.RequestException:
+        for start in range(0, len(entries), BATCH_SIZE):
+            batch = entries[start : start + BATCH_SIZE]
+            rows = []
+            prepared = []
+            for entry in batch:
                 entry.setdefault("retries", 0)
-                entry["retries"] += 1
-                remaining.append(entry)
+                payload = entry.get("payload")
+                base64_image = entry.get("image_b64")
+                filename = entry.get("filename") or "pending.jpg"
+                storage_path = entry.get("storage_path")
+                try:
+                    # An image uploaded on an earlier flush is reused, not uploaded again
+                    image_bytes = (
+                        base64.b64decode(base64_image)
+                        if base64_image and not storage_path
+                        else None
+                    )
+                    row, storage_path = self._prepare_row(
+                        payload, image_bytes, filename, storage_path=storage_path
+                    )
+                    if storage_path:
+                        entry["storage_path"] = storage_path
+                    rows.append(row)
+                    prepared.append(entry)
+                except requests.RequestException:
+                    entry["retries"] += 1
+                    remaining.append(entry)
+            if rows:
+                # One PostgREST insert for the whole batch instead of a POST per row
+                self._insert_batch(rows, prepared, succeeded, remaining)
         self._write_pending_entries(remaining)
         return succeeded
 
+    def _insert_batch(
+        self,
+        rows: List[Dict[str, Any]],
+        entries: List[Dict[str, Any]],
+        succeeded: List[Dict[str, Any]],
+        remaining: List[Dict[str, Any]],
+    ) -> None:
+        """Insert rows in one request; on a 4xx rejection, split to isolate the bad row.
+
+        PostgREST rejects the whole array when a single row is invalid, so a
+        rejected batch is halved until only the offending row is left pending.
+        Transport errors and 5xx responses are not row-specific: every entry
+        stays pending without re-sending the halves.
+        """
+        try:
+            response = self._post_row(rows)
+            response.raise_for_status()
+            succeeded.extend(entries)
+            return
+        except requests.HTTPError as exc:
+            status = exc.response.status_code if exc.response is not None else None
+            rejected = status is not None and 400 <= status < 500
+        except requests.RequestException:
+            rejected = False
+        if rejected and len(rows) > 1:
+            mid = len(rows) // 2
+            self._insert_batch(rows[:mid], entries[:mid], succeeded, remaining)
+            self._insert_batch(rows[mid:], entries[mid:], succeeded, remaining)
+            return
+        for entry in entries:
+            entry["retries"] += 1
+            remaining.append(entry)
+
     # ------------------------------------------------------------------
     def _send_once(
         self,
         payload: Dict[str, Any],
-        base64_image: Optional[str],
+        image_bytes: Optional[bytes],
         filename: str,
     ) -> Dict[str, Any]:
+        insert_body, _ = self._prepare_row(payload, image_bytes, filename)
+        response = self._post_row(insert_body)
+        response.raise_for_status()
+        return {
+            "status": "success",
+            "data": response.json() if response.content else None,
+            "image_url": insert_body["image_url"],
+        }
+
+    def _prepare_row(
+        self,
+        payload: Dict[str, Any],
+        image_bytes: Optional[bytes],
+        filename: str,
+        storage_path: Optional[str] = None,
+    ) -> Tuple[Dict[str, Any], Optional[str]]:
+        """Validate payload, upload the image and build the row to insert.
+
+        Returns the row and the storage path of its image. Pass storage_path
+        (with no image_bytes) to point the row at an already uploaded image.
+        """
         if not self.cfg:
             raise requests.RequestException("Supabase configuration missing")
         if not isinstance(payload, dict):
@@ -122,30 +204,21 @@ class SupabaseDetectionWriter:
         if not isinstance(metadata, dict):
             metadata = {"value": metadata}
 
-        image_url = None
-        if base64_image:
-            image_bytes = base64.b64decode(base64_image)
+        if image_bytes:
             storage_path = self._build_storage_path(device_id, filename)
             self._upload_image(storage_path, image_bytes)
-            image_url = self._public_url(storage_path)
+        image_url = self._public_url(storage_path) if storage_path else None
 
-        insert_body = {
+        row = {
             "device_id": device_id,
             "status": payload.get("status"),
             "confidence": payload.get("confidence"),
             "metadata": metadata or None,
             "image_url": image_url,
         }
+        return row, storage_path
 
-        response = self._post_row(insert_body)
-        response.raise_for_status()
-        return {
-            "status": "success",
-            "data": response.json() if response.content else None,
-            "image_url": image_url,
-        }
-
-    def _post_row(self, body: Dict[str, Any]) -> requests.Response:
+    def _post_row(self, body: Union[Dict[str, Any], List[Dict[str, Any]]]) -> requests.Response:
         assert self.cfg is not None  # guarded by caller
         url = f"{self.cfg.url}/rest/v1/{self.cfg.table}"
         headers = {
@@ -154,7 +227,9 @@ class SupabaseDetectionWriter:
             "Content-Type": "application/json",
             "Prefer": "return=representation",
         }
-        return self.session.post(url, headers=headers, json=body, timeout=DEFAULT_TIMEOUT)
+        return self.session.post(
+            url, headers=headers, data=json_dumps(body), timeout=DEFAULT_TIMEOUT
+        )
 
     def _upload_image(self, storage_path: str, image_bytes: bytes) -> None:
         assert self.cfg is not None  # guarded by caller
@@ -192,8 +267,8 @@ class SupabaseDetectionWriter:
     def _read_pending_entries(self) -> list:
         path = self.pending_path
         try:
-            with open(path, "r", encoding="utf-8") as fh:
-                return json.load(fh)
+            with open(path, "rb") as fh:
+                return json_loads(fh.read())
         except FileNotFoundError:
             return []
         except json.JSONDecodeError:
@@ -202,6 +277,6 @@ class SupabaseDetectionWriter:
     def _write_pending_entries(self, entries: list) -> None:
         path = self.pending_path
         tmp_path = f"{path}.tmp"
-        with open(tmp_path, "w", encoding="utf-8") as fh:
-            json.dump(entries, fh)
+        with open(tmp_path, "wb") as fh:
+            fh.write(json_dumps(entries))
         os.replace(tmp_path, path)
@@ -3,21 +3,51 @@ Utility functions for YOLO Detection Service.
 
 Contains logging setup, timestamp generation, and helper functions.
 """
+import atexit
+import json
 import logging
+import os
+import queue
+import time
 from datetime import datetime, timezone
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
-from typing import Tuple
+from typing import Any, Dict, Optional, Set, Tuple
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson  # Faster JSON (de)serialization, optional
+except ImportError:
+    orjson = None
+
+# Class kinds stored in the lookup table built from model labels
+KIND_OTHER = 0
+KIND_PLANT = 1
+KIND_PEST = 2
+
+# Used when RS_LOG_LEVEL is unset, empty or not a known level name
+DEFAULT_LOG_LEVEL = "INFO"
 
 
 def setup_logging() -> logging.Logger:
-    """Setup structured logging with automatic rotation (5MB max, 3 backups)."""
+    """Setup structured logging with automatic rotation (5MB max, 3 backups).
+
+    Records go through a queue to a listener thread, so console and file I/O
+    never block the capture/inference threads. RS_LOG_LEVEL overrides the level.
+    """
     log_dir = Path(__file__).parent / "logs"
     log_dir.mkdir(exist_ok=True)
     log_file = log_dir / "yolo_detect.log"
 
     logger = logging.getLogger("yolo_detect")
-    logger.setLevel(logging.DEBUG)
+    level_name = (os.getenv("RS_LOG_LEVEL") or DEFAULT_LOG_LEVEL).strip().upper()
+    level = logging.getLevelName(level_name)  # int for known names, "Level X" otherwise
+    level_valid = isinstance(level, int)
+    logger.setLevel(level if level_valid else DEFAULT_LOG_LEVEL)
 
     # Console handler (INFO level)
     console = logging.StreamHandler()
@@ -43,8 +73,14 @@ def setup_logging() -> logging.Logger:
         )
     )
 
-    logger.addHandler(console)
-    logger.addHandler(file_handler)
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(-1)
+    listener = QueueListener(log_queue, console, file_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)  # Flush queued records on exit
+
+    logger.addHandler(QueueHandler(log_queue))
+    if not level_valid:
+        logger.warning(f"Неизвестный RS_LOG_LEVEL={level_name!r}, используется {DEFAULT_LOG_LEVEL}")
 
     return logger
 
@@ -54,20 +90,108 @@ def iso_now() -> str:
     return datetime.now(timezone.utc).replace(microsecond=0).isoformat()
 
 
+# (second, formatted) swapped as one tuple so concurrent callers never see a torn pair
+_second_ts_cache: Tuple[int, str] = (-1, "")
+
+
+def second_timestamp(now: Optional[float] = None) -> str:
+    """Timestamp string for filenames (second precision), formatted once per second."""
+    global _second_ts_cache
+    second = int(time.time() if now is None else now)
+    cached_second, value = _second_ts_cache
+    if second != cached_second:
+        value = time.strftime("%Y%m%d_%H%M%S", time.localtime(second))
+        _second_ts_cache = (second, value)
+    return value
+
+
 def timestamp_str() -> str:
     """Generate timestamp string for filenames (millisecond precision)."""
-    return datetime.now().strftime("%Y%m%d_%H%M%S_%f")[:-3]
-
-
-def safe_bbox_coords(
-    xmin: int, ymin: int, xmax: int, ymax: int, w: int, h: int
-) -> Tuple[int, int, int, int]:
-    """Ensure bounding box coordinates are within frame bounds."""
-    xmin = max(0, min(xmin, w - 1))
-    ymin = max(0, min(ymin, h - 1))
-    xmax = max(0, min(xmax, w - 1))
-    ymax = max(0, min(ymax, h - 1))
-    return xmin, ymin, xmax, ymax
+    now = time.time()
+    # Cached per-second prefix; only the milliseconds are formatted per call
+    return f"{second_timestamp(now)}_{int(now * 1000) % 1000:03d}"
+
+
+def clip_boxes(xyxy: np.ndarray, w: int, h: int) -> np.ndarray:
+    """Clamp (N, 4) xyxy boxes to frame bounds in place; returns the same array."""
+    np.clip(xyxy[:, 0::2], 0, w - 1, out=xyxy[:, 0::2])
+    np.clip(xyxy[:, 1::2], 0, h - 1, out=xyxy[:, 1::2])
+    return xyxy
+
+
+# (xyxy int (N, 4), conf float32 (N,), cls int (N,)) parallel arrays
+Detections = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def boxes_to_arrays(boxes, min_conf: float = 0.0) -> Detections:
+    """Move YOLO boxes to NumPy in one transfer.
+
+    Boxes below min_conf are dropped on the model's device, before the copy.
+    None or empty boxes yield empty arrays.
+    """
+    if boxes is None or len(boxes) == 0:
+        return np.empty((0, 4), dtype=int), np.empty(0, dtype=np.float32), np.empty(0, dtype=int)
+    data = boxes.data  # [x1, y1, x2, y2, (track_id,) conf, cls]
+    if min_conf > 0:
+        data = data[data[:, -2] >= min_conf]
+    data = data.cpu().numpy()
+    return (
+        data[:, :4].astype(int),
+        data[:, -2].astype(np.float32, copy=False),
+        data[:, -1].astype(int),
+    )
+
+
+def build_class_kinds(labels: Dict) -> np.ndarray:
+    """Precompute class index -> kind (plant / pest / other) from model labels."""
+    kinds = np.full(max(labels, default=-1) + 1, KIND_OTHER, dtype=np.int8)
+    for class_idx, name in labels.items():
+        name = str(name).lower()
+        if "chrysanthemum" in name:
+            kinds[class_idx] = KIND_PLANT
+        elif "mealybug" in name:
+            kinds[class_idx] = KIND_PEST
+    return kinds
+
+
+def json_dumps(obj: Any, indent: bool = False) -> bytes:
+    """Serialize object to UTF-8 JSON bytes (uses orjson when installed)."""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0)
+    return json.dumps(obj, indent=2 if indent else None).encode("utf-8")
+
+
+def json_loads(data: bytes) -> Any:
+    """Parse JSON bytes (uses orjson when installed)."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def set_thread_affinity(cpus: Set[int]) -> bool:
+    """Pin the calling thread to the given CPUs (Linux only). Returns True on success."""
+    if not cpus or not hasattr(os, "sched_setaffinity"):
+        return False
+    try:
+        os.sched_setaffinity(0, cpus)
+    except OSError as exc:
+        logger.warning(f"Не удалось закрепить поток за CPU {sorted(cpus)}: {exc}")
+        return False
+    return True
+
+
+def create_http_session(pool_maxsize: int = 4) -> requests.Session:
+    """Create a keep-alive HTTP session with a bounded pool and connect retries.
+
+    POST is not in urllib3's default retry methods, so only failures before the
+    request is sent (DNS, TCP/TLS connect) are retried - no duplicate inserts.
+    """
+    retry = Retry(total=3, backoff_factor=0.5, status_forcelist=[502, 503, 504])
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_maxsize, max_retries=retry)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
 
 
 # Create logger instance
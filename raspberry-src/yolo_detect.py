@@ -6,7 +6,7 @@
 Основные возможности:
     * Захват цветового потока с RealSense (по умолчанию 640x480 @ 15fps).
     * Инференс Ultralytics YOLO для определения статуса растений.
-    * Периодическая отправка результатов (основной кадр в base64 + JSON)
+    * Периодическая отправка результатов (основной кадр JPEG + JSON, multipart)
       на эндпоинт Lovable Cloud (используются переменные окружения).
     * HTTP-сервер (Flask) с маршрутами /snapshot и /status для внешних сервисов.
 
@@ -17,7 +17,11 @@
 
 Дополнительные опции:
     YOLO_MODEL_PATH (default: "best_ncnn_model")
+    RS_INFERENCE_SIZE (default: 640) - Размер входа YOLO (кадр уменьшается только для инференса)
+    RS_INFERENCE_HALF (default: 0) - FP16-инференс (CUDA: .pt/.engine; на CPU игнорируется)
+    RS_WARMUP_RUNS (default: 2) - Число прогревочных инференсов при старте (0 - без прогрева)
     RS_FRAME_WIDTH / RS_FRAME_HEIGHT / RS_FRAME_RATE
+    RS_COLOR_FORMAT   (default: "bgr8") - "yuyv": сырой YUYV с камеры, конвертация в BGR через OpenCV
     RS_SEND_INTERVAL  (секунды между отправками, default: 15)
     RS_ENABLE_AUTO_DETECTION (default: "0") - Включить автоматическую отправку детекций
     RS_STREAM_HOST    (default: "0.0.0.0")
@@ -25,6 +29,9 @@
     RS_ENABLE_DISPLAY (default: "0") - Включить OpenCV окно и клавиатурные команды (Q/P/S/F)
     RS_CONF_THRESHOLD (default: 0.5) - Минимальная уверенность для отображения детекций
     RS_JPEG_QUALITY   (default: 90) - Качество JPEG для стриминга
+    RS_OPENCV_THREADS (default: 0) - Потоки OpenCV parallel_for_ (0 - по умолчанию OpenCV)
+    RS_INFERENCE_CPUS (default: "") - Ядра для потока инференса, например "2,3" (остальные потоки — на других ядрах)
+    RS_LOG_LEVEL      (default: INFO) - Уровень логирования (DEBUG включает покадровые debug-сообщения)
 """
 
 import logging
@@ -45,6 +52,7 @@ from config import (
     WINDOW_NAME,
 )
 from flask_app import app, get_service
+from image_processing import jpeg_backend, opencv_backend
 from utils import logger
 
 
@@ -65,6 +73,8 @@ def main() -> None:
     logger.info(f"Model: {MODEL_PATH}")
     logger.info(f"Camera: {FRAME_WIDTH}x{FRAME_HEIGHT}@{FRAME_RATE}")
     logger.info(f"HTTP Server: {STREAM_HOST}:{STREAM_PORT}")
+    logger.info(f"OpenCV: {opencv_backend()}")
+    logger.info(f"JPEG: {jpeg_backend()}")
     logger.info("=" * 60)
     if ENABLE_AUTO_DETECTION:
         logger.info("✅ Automatic detection sending: ENABLED")
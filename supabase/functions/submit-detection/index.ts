@@ -52,6 +52,17 @@ const detectionPayloadSchema = z.object({
   .default([]),
 });
 
+// multipart/form-data carries the same fields, with images sent as raw JPEG parts
+const detectionFieldsSchema = detectionPayloadSchema.omit({
+  main_image: true,
+  plant_images: true,
+});
+
+const MAX_MAIN_IMAGE_BYTES = 11_000_000;
+const MAX_PLANT_IMAGE_BYTES = 9_000_000;
+
+type ImageSource = string | Uint8Array;
+
 const RATE_LIMIT_WINDOW_MS = 60_000;
 const DEFAULT_RATE_LIMIT = 60;
 const rateLimitState = new Map<string, { count: number; reset: number }>();
@@ -74,6 +85,15 @@ const validationErrorResponse = (issues: string[], headers: Record<string, strin
     },
   );
 
+const formDataParseErrorResponse = (headers: Record<string, string>) =>
+  new Response(
+    JSON.stringify({ error: "Invalid multipart/form-data body" }),
+    {
+      status: 400,
+      headers,
+    },
+  );
+
 const decodeBase64Image = (value: string, label: string) => {
   const cleaned = value.includes(",") ? value.split(",").pop() ?? "" : value;
   try {
@@ -114,6 +134,71 @@ const uploadImage = async (
   return urlData.signedUrl;
 };
 
+const toImageBuffer = (source: ImageSource, label: string) =>
+  typeof source === "string" ? decodeBase64Image(source, label) : source;
+
+const parseMultipartDetection = async (form: FormData) => {
+  const issues: string[] = [];
+
+  let metadata: unknown = undefined;
+  const metadataField = form.get("metadata");
+  if (typeof metadataField === "string" && metadataField.length > 0) {
+    try {
+      metadata = JSON.parse(metadataField);
+    } catch (_err) {
+      issues.push("metadata must be a valid JSON string");
+    }
+  }
+
+  const confidenceField = form.get("confidence");
+  const fields = detectionFieldsSchema.safeParse({
+    device_id: form.get("device_id") ?? undefined,
+    status: form.get("status") ?? undefined,
+    confidence: typeof confidenceField === "string" && confidenceField.length > 0
+      ? Number(confidenceField)
+      : null,
+    metadata,
+  });
+  if (!fields.success) {
+    issues.push(...fields.error.issues.map((issue) => issue.message));
+  }
+
+  const mainFile = form.get("main_image");
+  if (!(mainFile instanceof File) || mainFile.size === 0) {
+    issues.push("main_image is required");
+  } else if (mainFile.size >= MAX_MAIN_IMAGE_BYTES) {
+    issues.push("main_image too large");
+  }
+
+  const plantFiles = form.getAll("plant_images").filter(
+    (value): value is File => value instanceof File,
+  );
+  if (plantFiles.length > 3) {
+    issues.push("A maximum of 3 plant images is allowed");
+  }
+  if (plantFiles.some((file) => file.size === 0)) {
+    issues.push("plant image cannot be empty");
+  }
+  if (plantFiles.some((file) => file.size >= MAX_PLANT_IMAGE_BYTES)) {
+    issues.push("plant image too large");
+  }
+
+  if (issues.length > 0 || !fields.success) {
+    return { success: false as const, issues };
+  }
+
+  return {
+    success: true as const,
+    data: {
+      ...fields.data,
+      main_image: new Uint8Array(await (mainFile as File).arrayBuffer()) as ImageSource,
+      plant_images: await Promise.all(
+        plantFiles.map(async (file) => new Uint8Array(await file.arrayBuffer()) as ImageSource),
+      ),
+    },
+  };
+};
+
 serve(async (req) => {
   const requestId = crypto.randomUUID();
   const requestStart = performance.now();
@@ -163,20 +248,48 @@ serve(async (req) => {
     // API key is valid if we reached here
     const apiKeyValid = true;
 
-    // Parse request body
-    let payloadJson: unknown;
-    try {
-      payloadJson = await req.json();
-    } catch (_err) {
-      console.error(`[${requestId}] Request body is not valid JSON`);
-      return jsonParseErrorResponse(headersWithRequestId);
-    }
+    // Parse request body: multipart/form-data (raw JPEG parts) or JSON (base64 images)
+    let detection: {
+      device_id: string;
+      main_image: ImageSource;
+      plant_images: ImageSource[];
+      status: "noObjects" | "healthy" | "diseased" | "mixed";
+      confidence?: number | null;
+      metadata: Record<string, unknown>;
+    };
+
+    const contentType = req.headers.get("content-type") ?? "";
+    if (contentType.startsWith("multipart/form-data")) {
+      let form: FormData;
+      try {
+        form = await req.formData();
+      } catch (_err) {
+        console.error(`[${requestId}] Request body is not valid multipart/form-data`);
+        return formDataParseErrorResponse(headersWithRequestId);
+      }
 
-    const parsed = detectionPayloadSchema.safeParse(payloadJson);
-    if (!parsed.success) {
-      const formatted = parsed.error.issues.map((issue) => issue.message);
-      logWithId("Payload validation failed", formatted);
-      return validationErrorResponse(formatted, headersWithRequestId);
+      const parsed = await parseMultipartDetection(form);
+      if (!parsed.success) {
+        logWithId("Payload validation failed", parsed.issues);
+        return validationErrorResponse(parsed.issues, headersWithRequestId);
+      }
+      detection = parsed.data;
+    } else {
+      let payloadJson: unknown;
+      try {
+        payloadJson = await req.json();
+      } catch (_err) {
+        console.error(`[${requestId}] Request body is not valid JSON`);
+        return jsonParseErrorResponse(headersWithRequestId);
+      }
+
+      const parsed = detectionPayloadSchema.safeParse(payloadJson);
+      if (!parsed.success) {
+        const formatted = parsed.error.issues.map((issue) => issue.message);
+        logWithId("Payload validation failed", formatted);
+        return validationErrorResponse(formatted, headersWithRequestId);
+      }
+      detection = parsed.data;
     }
 
     const {
@@ -186,7 +299,7 @@ serve(async (req) => {
       status,
       confidence,
       metadata,
-    } = parsed.data;
+    } = detection;
 
     logWithId('Received detection from device', { device_id, status });
 
@@ -238,7 +351,7 @@ serve(async (req) => {
 
     let mainImageUrl: string;
     try {
-      const mainImageBuffer = decodeBase64Image(main_image, "main_image");
+      const mainImageBuffer = toImageBuffer(main_image, "main_image");
       mainImageUrl = await uploadImage(
         supabase,
         mainImageFileName,
@@ -348,10 +461,10 @@ serve(async (req) => {
 
     // Upload plant images if provided
     if (plant_images.length > 0) {
-      const plantImagePromises = plant_images.map(async (imageBase64, index) => {
+      const plantImagePromises = plant_images.map(async (imageSource, index) => {
         const fileName = `${device_id}/${now}_plant_${index + 1}_${randomSuffix}.jpg`;
         try {
-          const imageBuffer = decodeBase64Image(imageBase64, `plant_images[${index}]`);
+          const imageBuffer = toImageBuffer(imageSource, `plant_images[${index}]`);
           const imageUrl = await uploadImage(
             supabase,
             fileName,